@@ -0,0 +1,539 @@
+"""
+Shared Tunnelblick helpers for the VPN CLI and monitor.
+
+Both tools drive Tunnelblick through AppleScript. Keeping the helpers in one
+module means a single persistent osascript process serves every call made
+by the running Python process.
+"""
+
+import getpass
+import glob
+import json
+import os
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, List, Tuple
+
+
+# JavaScript for Automation driver run by the persistent osascript process.
+# It reads one JSON-encoded AppleScript source per line from stdin, runs it
+# with NSAppleScript and replies with a status line (OK/ERR), the result text
+# and an end marker line.
+_OSA_DRIVER = r'''
+ObjC.import('Foundation');
+var input = $.NSFileHandle.fileHandleWithStandardInput;
+var output = $.NSFileHandle.fileHandleWithStandardOutput;
+var pending = '';
+
+function reply(status, text) {
+    var message = status + '\n' + text + '\n<<END>>\n';
+    output.writeData($(message).dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function execute(source) {
+    var error = Ref();
+    var result = $.NSAppleScript.alloc.initWithSource(source).executeAndReturnError(error);
+    if (result.isNil()) {
+        reply('ERR', ObjC.deepUnwrap(error[0]).NSAppleScriptErrorMessage);
+    } else {
+        var text = result.stringValue;
+        reply('OK', text.isNil() ? '' : text.js);
+    }
+}
+
+while (true) {
+    var data = input.availableData;
+    if (data.length == 0) {
+        break;
+    }
+    pending += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+    var end;
+    while ((end = pending.indexOf('\n')) >= 0) {
+        var line = pending.slice(0, end);
+        pending = pending.slice(end + 1);
+        execute(JSON.parse(line));
+    }
+}
+'''
+
+_OSA_END_MARKER = b'\n<<END>>\n'
+
+# Upper bound on a single AppleScript call (seconds), so a hung script can't stall the caller
+_APPLESCRIPT_TIMEOUT = 10
+
+# Upper bound on compiling a template with osacompile (seconds)
+_OSACOMPILE_TIMEOUT = 30
+
+# One "name<TAB>state" line per configuration, as produced by the list template
+_STATE_RE = re.compile(rb'^(?P<name>[^\t\n]+)\t(?P<state>[A-Z_]+)$', re.MULTILINE)
+
+
+class _OsaScriptServer:
+    """
+    Long-lived osascript co-process that runs AppleScript sent over a pipe.
+
+    Spawning osascript for every call costs tens of milliseconds; keeping a
+    single process around turns each call into a pipe round trip.
+    """
+
+    _instance: Optional['_OsaScriptServer'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Initialize the server. The osascript process is started on first use.
+        """
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> '_OsaScriptServer':
+        """
+        Get the process-wide server instance.
+
+        Return Value(s):
+            _OsaScriptServer: Shared server instance
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _ensure_process(self) -> subprocess.Popen:
+        """
+        Start the osascript process if it is not running.
+
+        Return Value(s):
+            subprocess.Popen: Running osascript process
+        """
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(['osascript', '-l', 'JavaScript', '-e', _OSA_DRIVER],
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE)
+        return self._process
+
+    def _read_reply(self, process: subprocess.Popen, timeout: Optional[float]) -> Tuple[bool, bytes]:
+        """
+        Read one reply from the osascript process, draining stdout and stderr together.
+
+        Arg(s):
+            process (subprocess.Popen): Running osascript process
+            timeout (Optional[float]): Seconds to wait for the reply, None to wait forever
+        Return Value(s):
+            Tuple[bool, bytes]: Success flag and raw result (or error message)
+        """
+        # select() rather than poll(), which is unreliable on macOS
+        stdout_fd = process.stdout.fileno()
+        stderr_fd = process.stderr.fileno()
+        watched = [stdout_fd, stderr_fd]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        output = b''
+        errors = b''
+
+        while _OSA_END_MARKER not in output:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select(watched, [], [], remaining)
+            if not readable:
+                raise TimeoutError("timed out waiting for osascript")
+            for fd in readable:
+                chunk = os.read(fd, 65536)
+                if fd == stdout_fd:
+                    if not chunk:
+                        message = errors.decode('utf-8', 'replace').strip()
+                        raise EOFError(message or "osascript exited unexpectedly")
+                    output += chunk
+                elif chunk:
+                    errors += chunk
+                else:
+                    watched.remove(stderr_fd)
+
+        # Reply layout: status line, result text, end marker
+        status, _, text = output[:output.index(_OSA_END_MARKER)].partition(b'\n')
+        return status == b'OK', text
+
+    def run(self, script: str, timeout: Optional[float] = None) -> Tuple[bool, bytes]:
+        """
+        Execute AppleScript in the persistent osascript process.
+
+        Arg(s):
+            script (str): AppleScript code to execute
+            timeout (Optional[float]): Seconds to wait for the result, None to wait forever
+        Return Value(s):
+            Tuple[bool, bytes]: Success flag and raw result (or error message)
+        """
+        request = (json.dumps(script) + '\n').encode('ascii')
+        with self._lock:
+            try:
+                process = self._ensure_process()
+                try:
+                    process.stdin.write(request)
+                    process.stdin.flush()
+                except BrokenPipeError:
+                    # The process died since the last call; nothing was executed, so retry once
+                    self._process = None
+                    process = self._ensure_process()
+                    process.stdin.write(request)
+                    process.stdin.flush()
+                return self._read_reply(process, timeout)
+            except TimeoutError as e:
+                # The script is still running, so the process can't take new requests
+                process.kill()
+                process.wait()
+                self._process = None
+                return False, str(e).encode('utf-8')
+            except (BrokenPipeError, EOFError) as e:
+                # Drop the process so the next call starts a fresh one
+                self._process = None
+                return False, str(e).encode('utf-8')
+
+
+def run_applescript(script: str, timeout: float = _APPLESCRIPT_TIMEOUT) -> bytes:
+    """
+    Execute AppleScript and return the raw output.
+
+    Arg(s):
+        script (str): AppleScript code to execute
+        timeout (float): Seconds to wait before giving up on the script
+    Return Value(s):
+        bytes: UTF-8 output from the AppleScript execution, empty on error or timeout
+    """
+    success, output = _OsaScriptServer.instance().run(script, timeout)
+    if not success:
+        print(f"AppleScript error: {output.decode('utf-8', 'replace')}")
+        return b""
+    return output.strip()
+
+
+def _quote_applescript(value: str) -> str:
+    """
+    Quote a value as an AppleScript string literal.
+
+    Arg(s):
+        value (str): Value to quote
+    Return Value(s):
+        str: AppleScript string literal safe to embed in a script
+    """
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+# AppleScript templates, compiled once with osacompile and run with their
+# arguments passed as parameters rather than interpolated into the source
+_APPLESCRIPT_TEMPLATES = {
+    'list': '''
+on run argv
+    tell application "Tunnelblick"
+        set vpnNames to name of configurations
+        set vpnStates to state of configurations
+    end tell
+    set output to ""
+    repeat with i from 1 to count of vpnNames
+        set output to output & (item i of vpnNames) & tab & (item i of vpnStates) & linefeed
+    end repeat
+    return output
+end run
+''',
+    'get_status': '''
+on run argv
+    set configName to item 1 of argv
+    tell application "Tunnelblick"
+        set matches to configurations whose name is configName
+        if matches is {} then return "NOT_FOUND"
+        return state of item 1 of matches
+    end tell
+end run
+''',
+    'connect': '''
+on run argv
+    set configName to item 1 of argv
+    set vpnPassword to item 2 of argv
+
+    tell application "Tunnelblick"
+        connect configName
+    end tell
+
+    -- Wait up to 10 seconds for the login dialog, checking often so it is filled as soon as it appears.
+    -- The password field can show up after the window, so wait for the field itself.
+    set waitStart to current date
+    set dialogReady to false
+    repeat until dialogReady or ((current date) - waitStart) > 10
+        try
+            tell application "System Events"
+                set dialogReady to exists text field 2 of window "Tunnelblick: Login Required" of process "Tunnelblick"
+            end tell
+        on error
+            -- Continue trying
+        end try
+        if not dialogReady then delay 0.05
+    end repeat
+
+    -- Send the credentials using System Events
+    if dialogReady then
+        try
+            tell application "System Events"
+                tell window "Tunnelblick: Login Required" of process "Tunnelblick"
+                    set focused of text field 2 to true
+                    set value of text field 2 to vpnPassword
+                    delay 0.2
+                    if exists button "OK" then click button "OK"
+                end tell
+            end tell
+        end try
+    end if
+
+    -- Wait up to 30 seconds for the connection to establish, polling quickly at first
+    set waitDelay to 0.1
+    set waited to 0
+    tell application "Tunnelblick"
+        repeat while waited < 30
+            set vpnState to state of first configuration whose name is configName
+            if vpnState is "CONNECTED" then return "OK"
+            if vpnState contains "EXITING" or vpnState contains "DISCONNECTED" then return vpnState
+            delay waitDelay
+            set waited to waited + waitDelay
+            set waitDelay to waitDelay * 2
+            if waitDelay > 1 then set waitDelay to 1
+        end repeat
+    end tell
+    return "TIMEOUT"
+end run
+''',
+    'disconnect': '''
+on run argv
+    set configName to item 1 of argv
+    tell application "Tunnelblick"
+        disconnect configName
+    end tell
+    return ""
+end run
+''',
+}
+
+_SCRIPT_CACHE_DIR = Path.home() / '.cache' / 'tunnelblick_cli'
+
+# Compiled script path per template name (None when compilation failed)
+_compiled_scripts: Dict[str, Optional[Path]] = {}
+
+
+def _compile_script(name: str) -> Optional[Path]:
+    """
+    Compile an AppleScript template to a .scpt file, reusing a previous build.
+
+    Arg(s):
+        name (str): Name of the template in _APPLESCRIPT_TEMPLATES
+    Return Value(s):
+        Optional[Path]: Path of the compiled script, None if compilation failed
+    """
+    source = _APPLESCRIPT_TEMPLATES[name]
+    source_path = _SCRIPT_CACHE_DIR / f"{name}.applescript"
+    compiled_path = _SCRIPT_CACHE_DIR / f"{name}.scpt"
+
+    try:
+        _SCRIPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        if compiled_path.exists() and source_path.exists() and source_path.read_text() == source:
+            return compiled_path
+
+        source_path.write_text(source)
+        subprocess.run(['osacompile', '-o', str(compiled_path), str(source_path)],
+                       capture_output=True, check=True, timeout=_OSACOMPILE_TIMEOUT)
+        return compiled_path
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        # Remove the source copy so an older .scpt isn't mistaken for this build next time
+        try:
+            source_path.unlink()
+        except OSError:
+            pass
+        return None
+
+
+def run_compiled(name: str, *argv: str, timeout: float = _APPLESCRIPT_TIMEOUT) -> bytes:
+    """
+    Run a precompiled AppleScript template with the given arguments.
+
+    Arg(s):
+        name (str): Name of the template in _APPLESCRIPT_TEMPLATES
+        *argv (str): Arguments passed to the script's run handler
+        timeout (float): Seconds to wait before giving up on the script
+    Return Value(s):
+        bytes: UTF-8 output from the AppleScript execution
+    """
+    if name not in _compiled_scripts:
+        _compiled_scripts[name] = _compile_script(name)
+
+    compiled_path = _compiled_scripts[name]
+    if compiled_path is not None:
+        target = f"POSIX file {_quote_applescript(str(compiled_path))}"
+    else:
+        # Fall back to compiling the template source on every call
+        target = _quote_applescript(_APPLESCRIPT_TEMPLATES[name])
+
+    parameters = ', '.join(_quote_applescript(arg) for arg in argv)
+    return run_applescript(f"run script ({target}) with parameters {{{parameters}}}", timeout)
+
+
+def get_all_states() -> Dict[str, str]:
+    """
+    Get the state of every VPN configuration with a single AppleScript call.
+
+    Return Value(s):
+        Dict[str, str]: Mapping of configuration name to its state
+    """
+    # One pass over the raw output; only the matched fields are decoded
+    output = run_compiled('list')
+    return {m['name'].decode('utf-8'): m['state'].decode('ascii') for m in _STATE_RE.finditer(output)}
+
+
+def get_vpn_configurations() -> List[str]:
+    """
+    Get list of available VPN configurations from Tunnelblick.
+
+    Return Value(s):
+        List[str]: List of VPN configuration names
+    """
+    return list(get_all_states())
+
+
+_TUNNELBLICK_LOG_DIR = Path('/Library/Application Support/Tunnelblick/Logs')
+
+# Only the end of the OpenVPN log is scanned for state changes
+_LOG_TAIL_BYTES = 16384
+
+# OpenVPN log messages and the state each one marks; the latest in the log wins
+_LOG_STATE_MARKERS = (
+    (b'Initialization Sequence Completed', 'CONNECTED'),
+    (b'process restarting', 'RECONNECTING'),
+    (b'process exiting', 'EXITING'),
+    (b'Exiting due to fatal error', 'EXITING'),
+)
+
+def find_log_file(config_name: str) -> Optional[Path]:
+    """
+    Find the OpenVPN log file Tunnelblick writes for a configuration.
+
+    Arg(s):
+        config_name (str): Name of the VPN configuration
+    Return Value(s):
+        Optional[Path]: Path of the most recent log file, None if there is none
+    """
+    # Not cached, since Tunnelblick may start a newer log for the same configuration.
+    # Log names embed the configuration path with "-" escaped as "--" and "/" as "-S"
+    encoded_name = config_name.replace('-', '--').replace('/', '-S')
+    pattern = f"*-S{glob.escape(encoded_name)}.tblk-S*.openvpn.log"
+    try:
+        candidates = sorted(_TUNNELBLICK_LOG_DIR.glob(pattern), key=lambda path: path.stat().st_mtime)
+    except OSError:
+        return None
+    return candidates[-1] if candidates else None
+
+
+def _get_log_state(config_name: str) -> Optional[str]:
+    """
+    Get the connection state from the tail of the configuration's OpenVPN log.
+
+    Arg(s):
+        config_name (str): Name of the VPN configuration
+    Return Value(s):
+        Optional[str]: Status of the VPN connection, None if the log doesn't tell
+    """
+    log_file = find_log_file(config_name)
+    if log_file is None:
+        return None
+
+    try:
+        with open(log_file, 'rb') as log:
+            size = log.seek(0, os.SEEK_END)
+            log.seek(max(0, size - _LOG_TAIL_BYTES))
+            tail = log.read()
+    except OSError:
+        return None
+
+    state = None
+    latest = -1
+    for marker, marker_state in _LOG_STATE_MARKERS:
+        position = tail.rfind(marker)
+        if position > latest:
+            latest = position
+            state = marker_state
+    return state
+
+
+def get_vpn_status(config_name: str) -> str:
+    """
+    Get the connection status of a specific VPN configuration.
+
+    The OpenVPN log is checked first since reading it is much cheaper than
+    asking Tunnelblick. Only states the log reports as down are trusted:
+    a log still ending in "Initialization Sequence Completed" can outlive an
+    OpenVPN process that died without logging, so CONNECTED is always
+    confirmed with Tunnelblick, as are a missing or inconclusive log.
+
+    Arg(s):
+        config_name (str): Name of the VPN configuration
+    Return Value(s):
+        str: Status of the VPN connection (CONNECTED, EXITING, etc.)
+    """
+    state = _get_log_state(config_name)
+    if state is not None and state != "CONNECTED":
+        return state
+
+    result = run_compiled('get_status', config_name)
+    # The result is a short ASCII state token
+    return result.decode('ascii', 'ignore').strip() or "UNKNOWN"
+
+
+def connect_vpn(config_name: str, password: str) -> bool:
+    """
+    Connect to VPN with the provided credentials.
+
+    Arg(s):
+        config_name (str): Name of the VPN configuration
+        password (str): Complete password (prefix + token)
+    Return Value(s):
+        bool: True if connection was successful, False otherwise
+    """
+    # Connect, fill in the login dialog and wait for the result in a single script
+    # The script waits up to 10s for the dialog and 30s for the connection
+    return run_compiled('connect', config_name, password, timeout=60) == b"OK"
+
+
+def disconnect_vpn(config_name: str) -> bool:
+    """
+    Disconnect from the specified VPN configuration.
+
+    Arg(s):
+        config_name (str): Name of the VPN configuration
+    Return Value(s):
+        bool: True if disconnection was successful, False otherwise
+    """
+    run_compiled('disconnect', config_name)
+
+    # Wait up to 10 seconds for disconnection, polling quickly at first
+    deadline = time.monotonic() + 10
+    delay = 0.1
+    while time.monotonic() < deadline:
+        status = get_vpn_status(config_name)
+        if "EXITING" in status or "DISCONNECTED" in status:
+            return True
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+    return False
+
+
+def prompt_password(prompt: str) -> str:
+    """
+    Prompt for a password without echo, or read it from stdin when stdin is not a terminal.
+
+    Arg(s):
+        prompt (str): Prompt shown to the user
+    Return Value(s):
+        str: Password that was entered
+    """
+    if not sys.stdin.isatty():
+        # Piped input (scripts, launchd): skip getpass, which opens /dev/tty
+        return sys.stdin.readline().rstrip('\n')
+    return getpass.getpass(prompt)
@@ -13,191 +13,20 @@ Examples:
     python3 tunnelblick_vpn.py list
 """
 
-import subprocess
-import sys
-import time
-import getpass
-from typing import Optional, List
 import argparse
 
-
-def _run_applescript(script: str) -> str:
-    """
-    Execute AppleScript and return the output.
-
-    Arg(s):
-        script (str): AppleScript code to execute
-    Return Value(s):
-        str: Output from the AppleScript execution
-    """
-    try:
-        result = subprocess.run(['osascript', '-e', script],
-                              capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"AppleScript error: {e.stderr}")
-        return ""
-
-
-def _get_vpn_configurations() -> List[str]:
-    """
-    Get list of available VPN configurations from Tunnelblick.
-
-    Return Value(s):
-        List[str]: List of VPN configuration names
-    """
-    script = '''
-    tell application "Tunnelblick"
-        get name of configurations
-    end tell
-    '''
-
-    result = _run_applescript(script)
-    if result:
-        # Parse the AppleScript list format
-        configs = result.replace('{', '').replace('}', '').split(', ')
-        return [config.strip('"') for config in configs if config.strip()]
-    return []
-
-
-def _get_vpn_status(config_name: str) -> str:
-    """
-    Get the connection status of a specific VPN configuration.
-
-    Arg(s):
-        config_name (str): Name of the VPN configuration
-    Return Value(s):
-        str: Status of the VPN connection (CONNECTED, EXITING, etc.)
-    """
-    script = '''
-    tell application "Tunnelblick"
-        get properties of configurations
-    end tell
-    '''
-
-    result = _run_applescript(script)
-    if not result:
-        return "UNKNOWN"
-
-    # Parse the properties string to find the status for our config
-    # Format: autoconnect:NO, state:EXITING, bytesOut:0, name:home-vpn2, class:configuration, bytesIn:0, ...
-    configs = result.split('class:configuration')
-    for config_block in configs:
-        if f'name:{config_name}' in config_block:
-            # Extract state from this block
-            state_start = config_block.find('state:')
-            if state_start != -1:
-                state_end = config_block.find(',', state_start)
-                if state_end == -1:
-                    state_end = len(config_block)
-                return config_block[state_start + 6:state_end].strip()
-
-    return "NOT_FOUND"
-
-
-def _connect_vpn(config_name: str, password: str) -> bool:
-    """
-    Connect to VPN with the provided credentials.
-
-    Arg(s):
-        config_name (str): Name of the VPN configuration
-        password (str): Complete password (prefix + token)
-    Return Value(s):
-        bool: True if connection was successful, False otherwise
-    """
-    # First, try to connect
-    script = f'''
-    tell application "Tunnelblick"
-        connect "{config_name}"
-    end tell
-    '''
-
-    _run_applescript(script)
-
-    # Wait a moment for the password dialog to appear
-    time.sleep(2)
-
-    # Send the credentials using System Events
-    password_script = f'''
-    tell application "System Events"
-        repeat 15 times
-            try
-                tell process "Tunnelblick"
-                    if exists window "Tunnelblick: Login Required" then
-                        tell window "Tunnelblick: Login Required"
-                            if exists text field 2 then
-                                set focused of text field 2 to true
-                                set value of text field 2 to "{password}"
-                                delay 0.2
-                                if exists button "OK" then
-                                    click button "OK"
-                                    exit repeat
-                                end if
-                            end if
-                        end tell
-                    end if
-                end tell
-            on error
-                -- Continue trying
-            end try
-            delay 0.7
-        end repeat
-    end tell
-    '''
-
-    _run_applescript(password_script)
-
-    # Wait for connection to establish
-    print("Waiting for VPN connection...")
-    for i in range(30):  # Wait up to 30 seconds
-        status = _get_vpn_status(config_name)
-        if status == "CONNECTED":
-            return True
-        elif "EXITING" in status or "DISCONNECTED" in status:
-            return False
-        time.sleep(1)
-        print(f"  Checking connection status... ({i+1}/30)")
-
-    return False
-
-
-def _disconnect_vpn(config_name: str) -> bool:
-    """
-    Disconnect from the specified VPN configuration.
-
-    Arg(s):
-        config_name (str): Name of the VPN configuration
-    Return Value(s):
-        bool: True if disconnection was successful, False otherwise
-    """
-    script = f'''
-    tell application "Tunnelblick"
-        disconnect "{config_name}"
-    end tell
-    '''
-
-    _run_applescript(script)
-
-    # Wait for disconnection
-    print("Disconnecting from VPN...")
-    for i in range(10):
-        status = _get_vpn_status(config_name)
-        if "EXITING" in status or "DISCONNECTED" in status:
-            return True
-        time.sleep(1)
-
-    return False
+import tb_core
 
 
 def list_configurations() -> None:
     """
     List all available VPN configurations.
     """
-    configs = _get_vpn_configurations()
-    if configs:
+    # Fetch every name and state in one round trip instead of one status query per configuration
+    states = tb_core.get_all_states()
+    if states:
         print("Available VPN configurations:")
-        for config in configs:
-            status = _get_vpn_status(config)
+        for config, status in states.items():
             print(f"  • {config} ({status})")
     else:
         print("No VPN configurations found.")
@@ -210,7 +39,7 @@ def show_status(config_name: str) -> None:
     Arg(s):
         config_name (str): Name of the VPN configuration
     """
-    status = _get_vpn_status(config_name)
+    status = tb_core.get_vpn_status(config_name)
     print(f"VPN '{config_name}' status: {status}")
 
 
@@ -222,7 +51,7 @@ def connect_vpn(config_name: str) -> None:
         config_name (str): Name of the VPN configuration
     """
     # Check if already connected
-    current_status = _get_vpn_status(config_name)
+    current_status = tb_core.get_vpn_status(config_name)
     if current_status == "CONNECTED":
         print(f"VPN '{config_name}' is already connected!")
         return
@@ -230,14 +59,15 @@ def connect_vpn(config_name: str) -> None:
     print(f"Connecting to VPN: {config_name}")
 
     # Get complete password (prefix + YubiKey token)
-    full_password = getpass.getpass("Password (prefix + YubiKey token): ")
+    full_password = tb_core.prompt_password("Password (prefix + YubiKey token): ")
 
     if not full_password:
         print("Error: Password cannot be empty")
         return
 
     print("Attempting to connect...")
-    if _connect_vpn(config_name, full_password):
+    print("Waiting for VPN connection...")
+    if tb_core.connect_vpn(config_name, full_password):
         print(f"✅ Successfully connected to VPN '{config_name}'!")
     else:
         print(f"❌ Failed to connect to VPN '{config_name}'")
@@ -251,13 +81,14 @@ def disconnect_vpn(config_name: str) -> None:
     Arg(s):
         config_name (str): Name of the VPN configuration
     """
-    current_status = _get_vpn_status(config_name)
+    current_status = tb_core.get_vpn_status(config_name)
     if "DISCONNECTED" in current_status or "EXITING" in current_status:
         print(f"VPN '{config_name}' is already disconnected!")
         return
 
     print(f"Disconnecting from VPN: {config_name}")
-    if _disconnect_vpn(config_name):
+    print("Disconnecting from VPN...")
+    if tb_core.disconnect_vpn(config_name):
         print(f"✅ Successfully disconnected from VPN '{config_name}'!")
     else:
         print(f"❌ Failed to disconnect from VPN '{config_name}'")
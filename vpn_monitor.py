@@ -11,133 +11,26 @@ Examples:
     python3 vpn_monitor.py MyVPNConfig --daemon
 """
 
-import subprocess
+import os
 import time
-import getpass
 import argparse
 import signal
 import sys
 import select
+import socket
+import stat
+import threading
 from pathlib import Path
 import keyring
 from typing import Optional
 
+import tb_core
 
-def _run_applescript(script: str) -> str:
-    """
-    Execute AppleScript and return the output.
+# Named pipe other tools can write YubiKey tokens to, one per line
+_TOKEN_FIFO = Path.home() / '.cache' / 'tunnelblick_cli' / 'token.fifo'
 
-    Arg(s):
-        script (str): AppleScript code to execute
-    Return Value(s):
-        str: Output from the AppleScript execution
-    """
-    try:
-        result = subprocess.run(['osascript', '-e', script],
-                              capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"AppleScript error: {e.stderr}")
-        return ""
-
-
-def _get_vpn_status(config_name: str) -> str:
-    """
-    Get the connection status of a specific VPN configuration.
-
-    Arg(s):
-        config_name (str): Name of the VPN configuration
-    Return Value(s):
-        str: Status of the VPN connection (CONNECTED, EXITING, etc.)
-    """
-    script = '''
-    tell application "Tunnelblick"
-        get properties of configurations
-    end tell
-    '''
-
-    result = _run_applescript(script)
-    if not result:
-        return "UNKNOWN"
-
-    # Parse the properties string to find the status for our config
-    # Format: autoconnect:NO, state:EXITING, bytesOut:0, name:home-vpn2, class:configuration, bytesIn:0, ...
-    configs = result.split('class:configuration')
-    for config_block in configs:
-        if f'name:{config_name}' in config_block:
-            # Extract state from this block
-            state_start = config_block.find('state:')
-            if state_start != -1:
-                state_end = config_block.find(',', state_start)
-                if state_end == -1:
-                    state_end = len(config_block)
-                return config_block[state_start + 6:state_end].strip()
-
-    return "NOT_FOUND"
-
-
-def _connect_vpn(config_name: str, password: str) -> bool:
-    """
-    Connect to VPN with the provided credentials.
-
-    Arg(s):
-        config_name (str): Name of the VPN configuration
-        password (str): Complete password (prefix + token)
-    Return Value(s):
-        bool: True if connection was successful, False otherwise
-    """
-    # First, try to connect
-    script = f'''
-    tell application "Tunnelblick"
-        connect "{config_name}"
-    end tell
-    '''
-
-    _run_applescript(script)
-
-    # Wait a moment for the password dialog to appear
-    time.sleep(2)
-
-    # Send the credentials using System Events
-    password_script = f'''
-    tell application "System Events"
-        repeat 15 times
-            try
-                tell process "Tunnelblick"
-                    if exists window "Tunnelblick: Login Required" then
-                        tell window "Tunnelblick: Login Required"
-                            if exists text field 2 then
-                                set focused of text field 2 to true
-                                set value of text field 2 to "{password}"
-                                delay 0.2
-                                if exists button "OK" then
-                                    click button "OK"
-                                    exit repeat
-                                end if
-                            end if
-                        end tell
-                    end if
-                end tell
-            on error
-                -- Continue trying
-            end try
-            delay 0.7
-        end repeat
-    end tell
-    '''
-
-    _run_applescript(password_script)
-
-    # Wait for connection to establish
-    for i in range(30):  # Wait up to 30 seconds
-        status = _get_vpn_status(config_name)
-        if status == "CONNECTED":
-            return True
-        elif "EXITING" in status or "DISCONNECTED" in status:
-            return False
-        time.sleep(1)
-
-    return False
+# How long to wait for a token on the FIFO when there is no terminal to prompt on (seconds)
+_TOKEN_FIFO_TIMEOUT = 30
 
 
 def _store_credentials(config_name: str, prefix: str) -> None:
@@ -172,16 +65,15 @@ def _get_stored_credentials(config_name: str) -> Optional[str]:
 
 def _check_internet_connectivity() -> bool:
     """
-    Check if we have internet connectivity by pinging a reliable server.
+    Check if we have internet connectivity by opening a TCP connection to a reliable DNS server.
 
     Return Value(s):
         bool: True if internet is accessible, False otherwise
     """
     try:
-        result = subprocess.run(['ping', '-c', '1', '-W', '5000', '8.8.8.8'],
-                              capture_output=True, check=True)
+        socket.create_connection(('8.8.8.8', 53), timeout=1.5).close()
         return True
-    except subprocess.CalledProcessError:
+    except OSError:
         return False
 
 
@@ -219,8 +111,22 @@ class VPNMonitor:
         """
         self.config_name = config_name
         self.check_interval = check_interval
-        self.running = False
         self.reconnect_count = 0
+        # Keychain lookups are slow, so the stored prefix is fetched once and cached
+        self._prefix: Optional[str] = None
+        # Set by the signal handler to stop the monitoring loop and wake it immediately
+        self._stop = threading.Event()
+        # kqueue watch state used by the monitoring loop
+        self._log_fd: Optional[int] = None
+        self._log_path: Optional[Path] = None
+        self._wakeup_fd: Optional[int] = None
+        # Only a terminal can deliver Enter presses; other stdins (e.g. /dev/null under launchd) aren't watched
+        self._watch_stdin = sys.stdin.isatty()
+        self._watch_log = True
+        # Token FIFO state, opened on first use
+        self._token_fd: Optional[int] = None
+        self._token_write_fd: Optional[int] = None
+        self._token_buffer = b''
 
         # Set up signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -235,15 +141,126 @@ class VPNMonitor:
             frame: Stack frame (unused)
         """
         print(f"\nReceived signal {signum}. Shutting down VPN monitor...")
-        self.running = False
+        self._stop.set()
+
+    def _prefix_cached(self) -> Optional[str]:
+        """
+        Get the stored password prefix, reading the keychain only on first use.
 
-    def _get_yubikey_token(self) -> str:
+        Return Value(s):
+            Optional[str]: Password prefix if found, None otherwise
+        """
+        if self._prefix is None:
+            self._prefix = _get_stored_credentials(self.config_name)
+        return self._prefix
+
+    def invalidate_prefix(self) -> None:
+        """
+        Drop the cached password prefix so the next use re-reads the keychain.
         """
-        Prompt for YubiKey token.
+        self._prefix = None
+
+    def _open_token_fifo(self) -> Optional[int]:
+        """
+        Open the token FIFO for non-blocking reads, creating it if needed.
+        Called when monitoring or testing starts, so tokens written from then on are queued.
 
         Return Value(s):
-            str: 6-digit token from YubiKey
+            Optional[int]: File descriptor to read tokens from, None if the FIFO is unavailable
         """
+        if self._token_fd is not None:
+            return self._token_fd
+
+        try:
+            _TOKEN_FIFO.parent.mkdir(parents=True, exist_ok=True)
+            if not _TOKEN_FIFO.exists():
+                os.mkfifo(_TOKEN_FIFO, 0o600)
+            if not stat.S_ISFIFO(os.stat(_TOKEN_FIFO).st_mode):
+                print(f"Error: {_TOKEN_FIFO} exists but is not a named pipe; remove it to accept tokens from other tools")
+                return None
+            token_fd = os.open(_TOKEN_FIFO, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                # Keep a writer open too: writers never block on open, and reads don't hit EOF between them
+                self._token_write_fd = os.open(_TOKEN_FIFO, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                os.close(token_fd)
+                raise
+        except OSError as e:
+            print(f"Error: Can't open token pipe {_TOKEN_FIFO}: {e}")
+            return None
+
+        self._token_fd = token_fd
+        return self._token_fd
+
+    def _read_fifo_token(self, timeout: float) -> Optional[str]:
+        """
+        Read the newest valid token queued on the token FIFO.
+
+        Arg(s):
+            timeout (float): How long to wait for a token to arrive (seconds)
+        Return Value(s):
+            Optional[str]: 6-digit token, None if none arrived in time
+        """
+        fd = self._token_fd
+        if fd is None:
+            return None
+
+        # Also wake for the signal wakeup pipe when the monitor loop has one; otherwise wait
+        # in short slices so a shutdown signal is acted on promptly either way
+        watched = [fd] if self._wakeup_fd is None else [fd, self._wakeup_fd]
+        slice_length = None if self._wakeup_fd is not None else 0.5
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._stop.is_set():
+                return None
+            remaining = max(0.0, deadline - time.monotonic())
+            wait = remaining if slice_length is None else min(remaining, slice_length)
+            readable = select.select(watched, [], [], wait)[0]
+            if self._wakeup_fd is not None and self._wakeup_fd in readable:
+                os.read(self._wakeup_fd, 512)
+                continue
+            if not readable:
+                if wait == remaining:
+                    return None
+                continue
+            try:
+                while True:
+                    chunk = os.read(fd, 4096)
+                    if not chunk:
+                        break
+                    self._token_buffer += chunk
+            except BlockingIOError:
+                pass
+
+            # Tokens expire quickly, so only the most recent complete line is used
+            *lines, self._token_buffer = self._token_buffer.split(b'\n')
+            tokens = [line.strip().decode('ascii', 'ignore') for line in lines]
+            tokens = [token for token in tokens if token.isdigit() and len(token) == 6]
+            if tokens:
+                return tokens[-1]
+            if remaining == 0:
+                return None
+
+    def _get_yubikey_token(self) -> Optional[str]:
+        """
+        Get a YubiKey token from the token FIFO, or prompt for one on a terminal.
+
+        Return Value(s):
+            Optional[str]: 6-digit token from YubiKey, None if no token was provided
+        """
+        interactive = sys.stdin.isatty()
+        if not interactive:
+            if self._token_fd is None:
+                print("No terminal to prompt on and no token pipe available; can't get a YubiKey token.")
+                return None
+            print(f"Waiting up to {_TOKEN_FIFO_TIMEOUT}s for a YubiKey token on {_TOKEN_FIFO}")
+
+        # A token pushed to the FIFO wins; without a terminal it is the only source
+        token = self._read_fifo_token(0 if interactive else _TOKEN_FIFO_TIMEOUT)
+        if token is not None or not interactive:
+            return token
+
         while True:
             token = input("YubiKey token (6 digits): ").strip()
             if token.isdigit() and len(token) == 6:
@@ -260,12 +277,13 @@ class VPNMonitor:
         print(f"Setting up credentials for VPN: {self.config_name}")
         print("These will be stored securely in your system keychain.")
 
-        prefix = getpass.getpass("Password prefix: ")
+        prefix = tb_core.prompt_password("Password prefix: ")
         if not prefix:
             print("Error: Password prefix cannot be empty")
             return False
 
         _store_credentials(self.config_name, prefix)
+        self.invalidate_prefix()
         return True
 
     def test_connection(self) -> bool:
@@ -275,25 +293,30 @@ class VPNMonitor:
         Return Value(s):
             bool: True if test connection was successful, False otherwise
         """
-        prefix = _get_stored_credentials(self.config_name)
+        prefix = self._prefix_cached()
         if not prefix:
             print("No stored credentials found. Please run setup first.")
             return False
 
+        self._open_token_fifo()
         print("Testing connection with stored credentials...")
         token = self._get_yubikey_token()
+        if token is None:
+            print("No YubiKey token provided.")
+            return False
         full_password = prefix + token
 
-        return _connect_vpn(self.config_name, full_password)
+        return tb_core.connect_vpn(self.config_name, full_password)
 
-    def _check_and_reconnect(self, prefix: str) -> None:
+    def _check_and_reconnect(self, prefix: str, reconnect: bool = True) -> None:
         """
         Check VPN status and reconnect if needed.
 
         Arg(s):
             prefix (str): Stored password prefix
+            reconnect (bool): Whether to attempt a reconnect when the VPN is down
         """
-        status = _get_vpn_status(self.config_name)
+        status = tb_core.get_vpn_status(self.config_name)
         current_time = time.strftime("%Y-%m-%d %H:%M:%S")
 
         if status == "CONNECTED":
@@ -302,12 +325,18 @@ class VPNMonitor:
             self.reconnect_count = 0
         else:
             print(f"[{current_time}] VPN is disconnected ({status}) ❌")
+            if not reconnect:
+                print("Will reconnect at the next scheduled check (or press Enter to reconnect now)")
+                return
             print("Attempting to reconnect...")
 
             token = self._get_yubikey_token()
+            if token is None:
+                print("❌ No YubiKey token provided. Will try again next cycle.")
+                return
             full_password = prefix + token
 
-            if _connect_vpn(self.config_name, full_password):
+            if tb_core.connect_vpn(self.config_name, full_password):
                 self.reconnect_count += 1
                 print(f"✅ Reconnected successfully (attempt #{self.reconnect_count})")
             else:
@@ -316,12 +345,92 @@ class VPNMonitor:
                 if not _check_internet_connectivity():
                     print("Note: No internet connectivity detected. Check your local network connection.")
 
+    def _open_log_watch(self) -> Optional[int]:
+        """
+        Open the configuration's OpenVPN log so kqueue can report changes to it.
+
+        Return Value(s):
+            Optional[int]: File descriptor of the log, None if there is no log yet
+        """
+        log_file = tb_core.find_log_file(self.config_name)
+        if log_file != self._log_path:
+            # Follow Tunnelblick to a newer log for this configuration
+            self._close_log_watch()
+        if self._log_fd is None and log_file is not None:
+            try:
+                self._log_fd = os.open(log_file, os.O_RDONLY)
+                self._log_path = log_file
+            except OSError:
+                pass
+        return self._log_fd
+
+    def _close_log_watch(self) -> None:
+        """
+        Stop watching the OpenVPN log.
+        """
+        if self._log_fd is not None:
+            os.close(self._log_fd)
+            self._log_fd = None
+        self._log_path = None
+
+    def _wait_for_event(self, kq: 'select.kqueue', timeout: float) -> Optional[str]:
+        """
+        Block until Enter is pressed, the OpenVPN log changes, a signal arrives or the timeout passes.
+
+        Arg(s):
+            kq (select.kqueue): Kernel event queue to wait on
+            timeout (float): Longest time to wait (seconds)
+        Return Value(s):
+            Optional[str]: "key" or "log" for the event that ended the wait, None otherwise
+        """
+        changes = [select.kevent(self._wakeup_fd, filter=select.KQ_FILTER_READ, flags=select.KQ_EV_ADD)]
+        if self._watch_stdin:
+            changes.append(select.kevent(sys.stdin.fileno(), filter=select.KQ_FILTER_READ,
+                                         flags=select.KQ_EV_ADD))
+        log_fd = self._open_log_watch() if self._watch_log else None
+        if log_fd is not None:
+            changes.append(select.kevent(log_fd, filter=select.KQ_FILTER_VNODE,
+                                         flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                                         fflags=select.KQ_NOTE_WRITE | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME))
+
+        trigger = None
+        for event in kq.control(changes, len(changes), timeout):
+            if event.flags & select.KQ_EV_ERROR:
+                # The registration was rejected; stop watching that source rather than
+                # treating it as ready, which would misfire or wake the loop constantly
+                if event.filter == select.KQ_FILTER_VNODE:
+                    print("Note: Can't watch the OpenVPN log; relying on scheduled checks.")
+                    self._watch_log = False
+                    self._close_log_watch()
+                elif event.ident != self._wakeup_fd:
+                    self._watch_stdin = False
+                continue
+            if event.filter == select.KQ_FILTER_VNODE:
+                if event.fflags & (select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME):
+                    # Tunnelblick replaced the log; look for the new one on the next wait
+                    self._close_log_watch()
+                trigger = trigger or "log"
+            elif event.ident == self._wakeup_fd:
+                # Drain the bytes the signal wakeup wrote
+                os.read(self._wakeup_fd, 512)
+            elif sys.stdin.readline():
+                trigger = "key"
+            else:
+                # stdin reached EOF, so nobody can press Enter
+                self._watch_stdin = False
+                try:
+                    kq.control([select.kevent(sys.stdin.fileno(), filter=select.KQ_FILTER_READ,
+                                              flags=select.KQ_EV_DELETE)], 0)
+                except OSError:
+                    pass
+        return trigger
+
     def start_monitoring(self) -> None:
         """
         Start monitoring the VPN connection and auto-reconnect when needed.
         Supports Enter key to trigger immediate check.
         """
-        prefix = _get_stored_credentials(self.config_name)
+        prefix = self._prefix_cached()
         if not prefix:
             print("No stored credentials found. Please run setup first.")
             return
@@ -331,32 +440,75 @@ class VPNMonitor:
         print("Press Enter to check VPN immediately, or Ctrl+C to stop monitoring")
         print("=" * 60)
 
-        self.running = True
+        # Open the token pipe now so tokens written at any point while monitoring are queued
+        self._open_token_fifo()
+
+        self._stop.clear()
         last_check_time = 0
 
+        # With kqueue (macOS) the loop sleeps until something happens instead of polling
+        kq = select.kqueue() if hasattr(select, 'kqueue') else None
+        if kq is not None:
+            # Signals write to this pipe so they also end a kqueue wait
+            self._wakeup_fd, wakeup_write_fd = os.pipe()
+            os.set_blocking(wakeup_write_fd, False)
+            previous_wakeup_fd = signal.set_wakeup_fd(wakeup_write_fd)
+
         try:
-            while self.running:
+            while not self._stop.is_set():
                 current_time = time.time()
-                key_pressed = _check_for_keypress()
-
-                # Check if it's time for regular check or key was pressed
-                if key_pressed or (current_time - last_check_time >= self.check_interval):
-                    if key_pressed:
+                if kq is not None:
+                    timeout = max(0.0, last_check_time + self.check_interval - current_time)
+                    trigger = self._wait_for_event(kq, timeout)
+                    current_time = time.time()
+                    if self._stop.is_set():
+                        break
+                else:
+                    trigger = "key" if _check_for_keypress() else None
+
+                # Reconnect attempts only happen on the regular schedule or when a key was pressed;
+                # a log change just refreshes the reported status
+                due = trigger == "key" or (current_time - last_check_time >= self.check_interval)
+                if due or trigger == "log":
+                    if trigger == "key":
                         print("🔄 Manual check triggered...")
 
-                    self._check_and_reconnect(prefix)
-                    last_check_time = current_time
-
-                    if self.running:
+                    if due:
+                        last_check_time = current_time
+                    try:
+                        self._check_and_reconnect(prefix, reconnect=due)
+                    except Exception as e:
+                        # Retry after a pause, but stay responsive to shutdown signals
+                        print(f"\nError during monitoring: {e}")
+                        print("Retrying in 5 seconds...")
+                        if self._stop.wait(5):
+                            break
+                        last_check_time = 0
+                        continue
+                    finally:
+                        if kq is not None:
+                            # Discard log changes made during the check itself (e.g. our own reconnect)
+                            kq.control(None, 8, 0)
+
+                    if due and not self._stop.is_set():
                         print(f"Next check in {self.check_interval}s (or press Enter for immediate check)")
 
-                # Short sleep to prevent excessive CPU usage
-                time.sleep(0.5)
+                # Without kqueue, poll with a short wait that returns early on shutdown
+                if kq is None and self._stop.wait(0.5):
+                    break
 
         except KeyboardInterrupt:
             print("\n\nReceived Ctrl+C. Stopping monitor...")
         except Exception as e:
             print(f"\nError during monitoring: {e}")
+        finally:
+            if kq is not None:
+                signal.set_wakeup_fd(previous_wakeup_fd)
+                os.close(wakeup_write_fd)
+                os.close(self._wakeup_fd)
+                self._wakeup_fd = None
+                self._close_log_watch()
+                kq.close()
 
         print("VPN monitoring stopped.")
 